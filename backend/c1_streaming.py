@@ -0,0 +1,59 @@
+import asyncio
+import functools
+from typing import Any, Callable
+
+from fastapi.responses import StreamingResponse
+from thesys_genui_sdk.c1_response import C1Response
+from thesys_genui_sdk.context import _current_c1_response_instance
+
+
+def with_c1_response() -> Callable:
+    """
+    Drop-in replacement for thesys_genui_sdk.fast_api.with_c1_response that
+    stops the generation task when the SSE client goes away.
+
+    The SDK version fires the route function as a detached task, so a closed
+    browser tab leaves it running: it keeps reading the upstream completion,
+    may start more tool-loop turns, and finally blocks forever on the
+    response queue. Here the body iterator cancels that task when Starlette
+    stops consuming it before the end of the stream (client disconnect).
+    The CancelledError is delivered to whatever the route is awaiting, so
+    routes should close their upstream streams in `async with` blocks and
+    persist partial output in an `except asyncio.CancelledError` handler.
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args: Any, **kwargs: Any) -> StreamingResponse:
+            c1_response_instance = C1Response()
+            _current_c1_response_instance.set(c1_response_instance)
+
+            async def run_and_signal() -> None:
+                try:
+                    await func(*args, **kwargs)
+                except asyncio.CancelledError:
+                    # Nobody is reading the queue anymore, don't wait on it.
+                    c1_response_instance._closed = True
+                    print(f"Client disconnected, cancelled {func.__name__}.")
+                    raise
+                finally:
+                    if not c1_response_instance._closed:
+                        await c1_response_instance.end()
+
+            task = asyncio.create_task(run_and_signal())
+
+            async def body_iterator():
+                completed = False
+                try:
+                    async for item in c1_response_instance.stream():
+                        yield item
+                    completed = True
+                finally:
+                    if not completed and not task.done():
+                        task.cancel()
+
+            return StreamingResponse(body_iterator(), media_type="text/event-stream")
+
+        return wrapper
+
+    return decorator
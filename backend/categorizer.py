@@ -0,0 +1,176 @@
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ledger import Ledger, LedgerSnapshot, parse_date
+
+# Keywords that mark money coming in. They only apply to credit rows, so a
+# debit such as "APTS SECURITY DEPOSIT" is labelled by the spending rules.
+INCOME_KEYWORDS: List[str] = [
+    "INCOMING", "WIRE TFR", "DEPOSIT", "PAYROLL", "DIRECT DEP", "REFUND", "STIPEND", "SCHOLARSHIP",
+]
+
+# Spending category rules, in priority order: the first category with a
+# keyword anywhere in the normalized description wins (e.g. "UBER EATS" is
+# Food before "UBER" is Transport, "CHEGG SUBSCRIPTION" is Books before
+# Subscriptions). Keywords are matched on whole words of the normalized text.
+# The dashboard has an icon for each of these names (StudentDashboard.tsx).
+CATEGORY_RULES: Dict[str, List[str]] = {
+    "Rent": ["RENT", "APTS", "APARTMENT", "APARTMENTS", "LEASE", "HOUSING"],
+    "Books": ["BOOKSTORE", "TEXTBOOK", "TEXTBOOKS", "CHEGG", "LIBRARY", "TUITION"],
+    "Subscriptions": [
+        "NETFLIX", "SPOTIFY", "HULU", "DISNEY", "PRIME STUDENT", "PRIME VIDEO", "AMZN PRIME",
+        "YOUTUBE PREMIUM", "APPLE COM BILL", "SUBSCRIPTION",
+    ],
+    "Utilities": ["T MOBILE", "VERIZON", "AT T", "COMCAST", "XFINITY", "UTIL", "UTILITIES", "ELECTRIC", "INTERNET"],
+    "Food": [
+        "UBER EATS", "DOORDASH", "GRUBHUB", "INSTACART", "STARBUCKS", "CHIPOTLE", "DOMINOS",
+        "PANDA EXPRESS", "MCDONALDS", "SUBWAY", "OLIVE GARDEN", "PUB", "GRILL", "CAFE", "COFFEE",
+        "PIZZA", "SUSHI", "BURGER", "RESTAURANT", "DINING", "TRADER JOES", "WHOLE FOODS", "GROCERY",
+        "SAFEWAY", "KROGER", "VENDING", "COKE", "PEPSI", "COCA COLA",
+    ],
+    "Transport": ["UBER", "LYFT", "TAXI", "FLIGHT", "AIRLINES", "METRO", "TRANSIT", "PARKING", "SHELL", "CHEVRON"],
+    "Fitness": ["FITNESS", "GYM"],
+    "Health": ["PHARMACY", "CVS", "WALGREENS", "CLINIC", "DENTAL", "HOSPITAL"],
+    "Shopping": ["AMZN", "AMAZON", "TARGET", "WALMART", "IKEA", "H M", "NIKE", "MALL", "BEST BUY", "COSTCO"],
+    "Entertainment": ["AMC", "THEATRES", "CINEMA", "CLUB", "MIXER", "CONCERT", "TICKETMASTER", "STEAM", "BAR"],
+}
+
+OTHER = "Other"
+INCOME = "Income"
+CATEGORIES: List[str] = [INCOME] + list(CATEGORY_RULES) + [OTHER]
+_OTHER_CODE = CATEGORIES.index(OTHER)
+_INCOME_CODE = CATEGORIES.index(INCOME)
+
+_NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+
+
+def _keyword_pattern(keywords: List[str]) -> str:
+    return "|".join(re.escape(k) for k in keywords)
+
+
+# All spending rules compiled into one pattern. re.match tries the branches in
+# order at position 0 and each branch scans the whole description, so
+# `lastgroup` names the highest-priority category with a matching keyword.
+_MATCHER = re.compile("|".join(
+    rf".*?\b(?P<c{CATEGORIES.index(name)}>{_keyword_pattern(keywords)})\b"
+    for name, keywords in CATEGORY_RULES.items()
+))
+_INCOME_MATCHER = re.compile(rf"\b(?:{_keyword_pattern(INCOME_KEYWORDS)})\b")
+
+
+def normalize(description: str) -> str:
+    """Uppercases and reduces punctuation to single spaces ("MCDONALD'S" -> "MCDONALDS")."""
+    return _NON_ALNUM.sub(" ", description.upper().replace("'", "")).strip()
+
+
+def _match_code(normalized: str) -> int:
+    m = _MATCHER.match(normalized)
+    return int(m.lastgroup[1:]) if m else _OTHER_CODE
+
+
+def _is_income(normalized: str) -> bool:
+    return _INCOME_MATCHER.search(normalized) is not None
+
+
+class CategoryIndex:
+    """
+    Per-row category labels for a ledger, computed in batch and cached.
+
+    Labels are stored as a uint8 code array aligned with the ledger rows, so
+    category totals are a single weighted bincount. Only rows added since the
+    last update (or moved by a back-dated insert) are matched, and each
+    distinct description is matched once. Codes are computed from ledger
+    snapshots, so they always line up with the rows they are reported with.
+    """
+
+    def __init__(self, ledger: Ledger):
+        self.ledger = ledger
+        self._lock = threading.Lock()
+        self._codes = np.empty(0, dtype=np.uint8)
+        # Ledger version the codes were computed for (None: not yet).
+        self._version: Optional[int] = None
+        self._by_description: Dict[str, Tuple[int, bool]] = {}
+
+    def _update(self, all_descriptions: bool = False) -> Tuple[np.ndarray, LedgerSnapshot]:
+        """
+        Labels rows added or moved since the last update, and returns all codes
+        with the ledger snapshot they belong to.
+        """
+        with self._lock:
+            start = 0 if all_descriptions else len(self._codes)
+            snapshot = self.ledger.snapshot(start, since_version=self._version)
+            keep = min(len(self._codes), snapshot.changed_from)
+            if keep < len(snapshot) or keep < len(self._codes):
+                self._codes = np.concatenate([self._codes[:keep], self._label_rows(snapshot, keep)])
+            self._version = snapshot.version
+            return self._codes, snapshot
+
+    def update(self) -> np.ndarray:
+        """Labels any ledger rows that are not labelled yet and returns all codes."""
+        return self._update()[0]
+
+    def _label_rows(self, snapshot: LedgerSnapshot, start: int) -> np.ndarray:
+        normalized = [normalize(snapshot.description(i)) for i in range(start, len(snapshot))]
+        if not normalized:
+            return np.empty(0, dtype=np.uint8)
+        unique, inverse = np.unique(normalized, return_inverse=True)
+        unique_codes = np.empty(len(unique), dtype=np.uint8)
+        unique_income = np.empty(len(unique), dtype=bool)
+        for i, text in enumerate(unique):
+            matched = self._by_description.get(text)
+            if matched is None:
+                matched = self._by_description[text] = (_match_code(text), _is_income(text))
+            unique_codes[i], unique_income[i] = matched
+        codes = unique_codes[inverse]
+
+        # Income keywords and the Other fallback only make credit rows Income.
+        credits = snapshot.credits[start:]
+        debits = snapshot.debits[start:]
+        incoming = ~np.isnan(credits) & np.isnan(debits)
+        codes[incoming & (unique_income[inverse] | (codes == _OTHER_CODE))] = _INCOME_CODE
+        return codes
+
+    def label(self, index: int) -> str:
+        return CATEGORIES[self.update()[index]]
+
+    def records(self) -> List[Dict]:
+        """The ledger's records (the /transactions shape), each with its Category."""
+        codes, snapshot = self._update(all_descriptions=True)
+        records = snapshot.records()
+        for record, code in zip(records, codes):
+            record["Category"] = CATEGORIES[code]
+        return records
+
+    def totals(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Dict[str, Dict]:
+        """
+        Spent/received totals and transaction counts per category, optionally
+        limited to an inclusive date range (MM/DD/YYYY or YYYY-MM-DD).
+        """
+        codes, snapshot = self._update()
+        debits = np.nan_to_num(snapshot.debits, nan=0.0)
+        credits = np.nan_to_num(snapshot.credits, nan=0.0)
+
+        mask = np.ones(len(codes), dtype=bool)
+        dates = snapshot.dates
+        if start_date:
+            mask &= dates >= parse_date(start_date)
+        if end_date:
+            mask &= dates <= parse_date(end_date)
+        codes, debits, credits = codes[mask], debits[mask], credits[mask]
+
+        size = len(CATEGORIES)
+        spent = np.bincount(codes, weights=-debits, minlength=size)
+        received = np.bincount(codes, weights=credits, minlength=size)
+        counts = np.bincount(codes, minlength=size)
+        return {
+            name: {
+                "spent": round(float(spent[code]), 2),
+                "received": round(float(received[code]), 2),
+                "count": int(counts[code]),
+            }
+            for code, name in enumerate(CATEGORIES)
+            if counts[code]
+        }
@@ -0,0 +1,646 @@
+import os
+import io
+import csv
+import json
+import shutil
+import argparse
+import threading
+from datetime import datetime
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+CSV_PATH = "student_transactions.csv"
+# Where the single-tenant backend kept its ledger; the default tenant adopts
+# it (see tenants.py).
+LEGACY_LEDGER_PATH = "student_transactions.ledger"
+
+# Column order of the CSV interchange format. Kept identical to the original
+# student_transactions.csv so exports can be dropped in wherever it was used.
+CSV_FIELDS = ["Date", "Description", "Debit", "Credit", "Balance"]
+
+FORMAT_VERSION = 1
+
+# Fixed-width columns, one raw little-endian array per file. Debit/Credit use
+# NaN for "empty", like pandas does when reading the CSV.
+FIXED_COLUMNS: Dict[str, np.dtype] = {
+    "date": np.dtype("<M8[D]"),
+    "debit": np.dtype("<f8"),
+    "credit": np.dtype("<f8"),
+    "balance": np.dtype("<f8"),
+}
+
+# Variable-width descriptions: UTF-8 bytes concatenated into one blob, plus
+# the end offset of every row. desc_offsets is written last on append, so its
+# length is the committed row count.
+OFFSETS_DTYPE = np.dtype("<i8")
+OFFSETS_FILE = "desc_offsets.bin"
+BLOB_FILE = "desc_blob.bin"
+META_FILE = "meta.json"
+
+# Tail rewrites save the bytes they overwrite next to each file, and list
+# them in the journal file, so they can be rolled back on the next open.
+JOURNAL_FILE = "journal.json"
+JOURNAL_SUFFIX = ".journal"
+
+# Writes remembered for snapshot(since_version=...); readers further behind
+# than this are told that every row changed.
+WRITE_LOG_SIZE = 256
+
+# Days past the last transaction the balance index covers before it has to
+# be rebuilt.
+BALANCE_INDEX_SLACK_DAYS = 366
+
+# 'MM/DD/YYYY' is the CSV format; the others show up in bank statements.
+DATE_FORMATS = ("%m/%d/%Y", "%Y-%m-%d", "%m/%d/%y", "%m-%d-%Y", "%Y/%m/%d", "%d %b %Y", "%b %d, %Y")
+
+
+def parse_date(value: str) -> np.datetime64:
+    """Parses 'MM/DD/YYYY', ISO 'YYYY-MM-DD' and the other DATE_FORMATS."""
+    value = value.strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return np.datetime64(datetime.strptime(value, fmt).date(), "D")
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date '{value}', expected MM/DD/YYYY")
+
+
+def format_date(value: np.datetime64) -> str:
+    return value.astype(datetime).strftime("%m/%d/%Y")
+
+
+def parse_amount(value: Optional[str]) -> float:
+    if value is None or not value.strip():
+        return float("nan")
+    return float(value)
+
+
+def format_amount(value: float) -> str:
+    return "" if np.isnan(value) else repr(float(value))
+
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _fsync_dir(path: str):
+    """Makes renames and deletions in `path` durable (a no-op where directories can't be opened)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _map_column(path: str, dtype: np.dtype, count: int) -> np.ndarray:
+    if count == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(count,))
+
+
+class FenwickTree:
+    """
+    Binary indexed tree over net amounts per day, keyed by day number.
+
+    Covers `size` days starting at `base`. Point updates and prefix sums are
+    O(log n), so the running balance at the end of any date is available
+    without scanning rows.
+    """
+
+    def __init__(self, base: int, values: np.ndarray):
+        self.base = base
+        index = np.arange(1, len(values) + 1)
+        prefix = np.concatenate([[0.0], np.cumsum(values)])
+        # tree[i] holds the sum of the (i & -i) values ending at i
+        self._tree: List[float] = [0.0] + (prefix[index] - prefix[index - (index & -index)]).tolist()
+
+    def covers(self, day: int) -> bool:
+        return self.base <= day < self.base + len(self._tree) - 1
+
+    def add(self, day: int, delta: float):
+        i = day - self.base + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, day: int) -> float:
+        """Sum of the amounts on or before `day`."""
+        i = min(day - self.base + 1, len(self._tree) - 1)
+        total = 0.0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+
+class Ledger:
+    """
+    Columnar transaction ledger stored as raw NumPy arrays on disk, kept in
+    date order.
+
+    Every column is memory-mapped read-only, so opening the ledger costs no
+    parsing. New rows are inserted after the rows of the same date: only the
+    tail of each file from the insertion point on is rewritten (nothing but an
+    append for current-dated rows), and a Fenwick tree over daily amounts
+    keeps balance lookups at O(log n).
+
+    Tail rewrites change the mapped files in place, so rows are read through
+    snapshot(), a consistent copy taken under the lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._balance_index: Optional[FenwickTree] = None
+        # Bumped by every write; (version, first row written) of recent writes.
+        self._version = 0
+        self._writes: Deque[Tuple[int, int]] = deque(maxlen=WRITE_LOG_SIZE)
+        # A ledger that doesn't exist yet reads as empty; its directory is
+        # only created by the first write.
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                version = json.load(f).get("version")
+            if version != FORMAT_VERSION:
+                raise ValueError(f"Unsupported ledger format version {version} in {path}")
+        self._recover()
+        self._load()
+
+    def _create(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(META_FILE), "w") as f:
+            json.dump({"version": FORMAT_VERSION, "columns": CSV_FIELDS}, f)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _size(self, name: str) -> int:
+        try:
+            return os.path.getsize(self._file(name))
+        except FileNotFoundError:
+            return 0
+
+    def _load(self):
+        """Maps all columns, dropping any partially written trailing row."""
+        count = self._size(OFFSETS_FILE) // OFFSETS_DTYPE.itemsize
+        for name, dtype in FIXED_COLUMNS.items():
+            count = min(count, self._size(f"{name}.bin") // dtype.itemsize)
+
+        offsets = _map_column(self._file(OFFSETS_FILE), OFFSETS_DTYPE, count)
+        blob_size = int(offsets[-1]) if count else 0
+        if self._size(BLOB_FILE) < blob_size:
+            raise ValueError(f"Ledger {self.path} is corrupt: description blob is truncated")
+
+        # Truncate leftovers from an interrupted append so the next append
+        # starts on a row boundary.
+        for name, dtype in FIXED_COLUMNS.items():
+            self._truncate(f"{name}.bin", count * dtype.itemsize)
+        self._truncate(OFFSETS_FILE, count * OFFSETS_DTYPE.itemsize)
+        self._truncate(BLOB_FILE, blob_size)
+
+        self._count = count
+        self._offsets = offsets
+        self._columns = {
+            name: _map_column(self._file(f"{name}.bin"), dtype, count)
+            for name, dtype in FIXED_COLUMNS.items()
+        }
+        self._blob = _map_column(self._file(BLOB_FILE), np.dtype("u1"), blob_size)
+
+    def _truncate(self, name: str, size: int):
+        if self._size(name) > size:
+            with open(self._file(name), "r+b") as f:
+                f.truncate(size)
+
+    def _recover(self):
+        """Rolls back a tail rewrite that was interrupted, using its journal."""
+        journal_path = self._file(JOURNAL_FILE)
+        if os.path.exists(journal_path + ".tmp"):
+            # Crashed before the journal was published, so no data was touched.
+            os.remove(journal_path + ".tmp")
+        if not os.path.exists(journal_path):
+            return
+        with open(journal_path) as f:
+            entries = json.load(f)
+        for name, (offset, size) in entries.items():
+            with open(self._file(name + JOURNAL_SUFFIX), "rb") as f:
+                tail = f.read()
+            with open(self._file(name), "r+b") as f:
+                f.seek(offset)
+                f.write(tail)
+                f.truncate(size)
+                _fsync(f)
+        self._clear_journal(entries)
+
+    def _recover_failed_write(self):
+        """Rolls back a failed tail rewrite whose rollback failed too (e.g. the disk was still full)."""
+        if os.path.exists(self._file(JOURNAL_FILE)):
+            self._recover()
+            self._load()
+
+    def _write_journal(self, offsets: Dict[str, int]) -> Dict[str, List[int]]:
+        entries = {}
+        for name, offset in offsets.items():
+            with open(self._file(name), "rb") as f:
+                f.seek(offset)
+                tail = f.read()
+            with open(self._file(name + JOURNAL_SUFFIX), "wb") as f:
+                f.write(tail)
+                _fsync(f)
+            entries[name] = [offset, self._size(name)]
+        # The journal only counts once this file exists, so it is published
+        # atomically and only after the saved tails are on disk.
+        journal_path = self._file(JOURNAL_FILE)
+        with open(journal_path + ".tmp", "w") as f:
+            json.dump(entries, f)
+            _fsync(f)
+        os.replace(journal_path + ".tmp", journal_path)
+        _fsync_dir(self.path)
+        return entries
+
+    def _clear_journal(self, entries: Dict[str, List[int]]):
+        os.remove(self._file(JOURNAL_FILE))
+        _fsync_dir(self.path)
+        for name in entries:
+            os.remove(self._file(name + JOURNAL_SUFFIX))
+
+    def _write_tail(self, pos: int, columns: Dict[str, np.ndarray], encoded: List[bytes]):
+        """
+        Replaces rows [pos:] with the given rows, which must be at least as
+        many. Writing at the current end is a plain append; anything earlier
+        is journaled first so a crash can't leave the columns misaligned.
+        """
+        if not os.path.exists(self._file(META_FILE)):
+            self._create()
+        blob_start = int(self._offsets[pos - 1]) if pos else 0
+        offsets = blob_start + np.cumsum([len(e) for e in encoded], dtype=OFFSETS_DTYPE)
+
+        writes = {BLOB_FILE: (blob_start, b"".join(encoded))}
+        for name, dtype in FIXED_COLUMNS.items():
+            writes[f"{name}.bin"] = (pos * dtype.itemsize, columns[name].astype(dtype).tobytes())
+        # Commit point: the row count is the length of the offsets file, so
+        # it is written (and synced) after everything else.
+        writes[OFFSETS_FILE] = (pos * OFFSETS_DTYPE.itemsize, offsets.tobytes())
+
+        try:
+            journal = None
+            if pos < self._count:
+                journal = self._write_journal({name: offset for name, (offset, _) in writes.items()})
+            for name, (offset, data) in writes.items():
+                with open(self._file(name), "r+b" if os.path.exists(self._file(name)) else "wb") as f:
+                    f.seek(offset)
+                    f.write(data)
+                    _fsync(f)
+            if journal is not None:
+                self._clear_journal(journal)
+        except BaseException:
+            # e.g. ENOSPC halfway: put the files back as they were before the
+            # next write can journal the half-written tails over the rollback.
+            self._recover()
+            self._load()
+            raise
+        self._load()
+        self._version += 1
+        self._writes.append((self._version, pos))
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def last_balance(self) -> float:
+        with self._lock:
+            if not self._count:
+                return 0.0
+            balance = float(self._columns["balance"][-1])
+        return 0.0 if np.isnan(balance) else balance
+
+    def _amounts(self, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        return (np.nan_to_num(self._columns["credit"][start:end], nan=0.0)
+                + np.nan_to_num(self._columns["debit"][start:end], nan=0.0))
+
+    def _description(self, index: int) -> str:
+        start = int(self._offsets[index - 1]) if index else 0
+        end = int(self._offsets[index])
+        return self._blob[start:end].tobytes().decode("utf-8")
+
+    def snapshot(self, start: int = 0, since_version: Optional[int] = None) -> "LedgerSnapshot":
+        """
+        Copies the ledger as of now: all fixed columns, and descriptions from
+        row `start` on. With `since_version` (the version of an earlier
+        snapshot), `changed_from` is the first row written since then, and
+        descriptions are copied from there on if that is earlier than `start`.
+        """
+        with self._lock:
+            count = self._count
+            changed_from = 0 if since_version is None else self._changed_since(since_version)
+            start = min(start, changed_from, count)
+            blob_start = int(self._offsets[start - 1]) if start else 0
+            blob_end = int(self._offsets[-1]) if count else 0
+            return LedgerSnapshot(
+                version=self._version,
+                start=start,
+                changed_from=changed_from,
+                columns={name: np.array(values) for name, values in self._columns.items()},
+                offsets=np.array(self._offsets[start:]) - blob_start,
+                blob=self._blob[blob_start:blob_end].tobytes(),
+            )
+
+    def _changed_since(self, version: int) -> int:
+        if version == self._version:
+            return self._count
+        if not self._writes or self._writes[0][0] > version + 1:
+            return 0
+        return min(pos for v, pos in self._writes if v > version)
+
+    def _get_balance_index(self) -> FenwickTree:
+        if self._balance_index is None:
+            days = self._columns["date"].astype(np.int64)
+            amounts = self._amounts()
+            if self._count:
+                base = int(days.min())
+                size = int(days.max()) - base + 1 + BALANCE_INDEX_SLACK_DAYS
+            else:
+                base, size = 0, 0
+            self._balance_index = FenwickTree(base, np.bincount(days - base, weights=amounts, minlength=size))
+        return self._balance_index
+
+    def _track_balances(self, dates: np.ndarray, amounts: np.ndarray):
+        if self._balance_index is None:
+            return
+        days = dates.astype(np.int64).tolist()
+        if not all(self._balance_index.covers(d) for d in days):
+            # Outside the indexed range, rebuild on next use.
+            self._balance_index = None
+            return
+        for day, amount in zip(days, amounts.tolist()):
+            self._balance_index.add(day, amount)
+
+    def _opening_balance(self) -> float:
+        """Balance before the first row (an imported statement need not start at 0)."""
+        if not self._count:
+            return 0.0
+        return float(np.nan_to_num(self._columns["balance"][0])) - float(self._amounts(0, 1)[0])
+
+    def balance_on(self, date: str) -> float:
+        """Balance at the end of `date`, in O(log n)."""
+        day = int(parse_date(date).astype(np.int64))
+        with self._lock:
+            index = self._get_balance_index()
+            return round(self._opening_balance() + index.prefix(day), 2)
+
+    def append_many(self, rows: Iterable[tuple]):
+        """
+        Appends (date, description, debit, credit, balance) rows as given,
+        e.g. from a CSV import. `debit`/`credit` are NaN when not applicable.
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        with self._lock:
+            self._recover_failed_write()
+            columns = {
+                "date": np.array([parse_date(r[0]) for r in rows], dtype=FIXED_COLUMNS["date"]),
+                "debit": np.array([r[2] for r in rows], dtype=FIXED_COLUMNS["debit"]),
+                "credit": np.array([r[3] for r in rows], dtype=FIXED_COLUMNS["credit"]),
+                "balance": np.array([r[4] for r in rows], dtype=FIXED_COLUMNS["balance"]),
+            }
+            self._write_tail(self._count, columns, [r[1].encode("utf-8") for r in rows])
+            self._track_balances(columns["date"], np.nan_to_num(columns["credit"]) + np.nan_to_num(columns["debit"]))
+
+    def insert(self, date: str, description: str, debit: float, credit: float) -> int:
+        """Inserts one row in date order and returns its position."""
+        return int(self.insert_many([(date, description, debit, credit)])[0])
+
+    def insert_many(self, rows: Iterable[tuple]) -> np.ndarray:
+        """
+        Inserts (date, description, debit, credit) rows in date order, after
+        any rows already on the same date, and returns their positions.
+
+        Balances are computed for the new rows and shifted for every later row;
+        only that tail is rewritten on disk.
+        """
+        rows = list(rows)
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        with self._lock:
+            self._recover_failed_write()
+            dates = np.array([parse_date(r[0]) for r in rows], dtype=FIXED_COLUMNS["date"])
+            debits = np.array([r[2] for r in rows], dtype=FIXED_COLUMNS["debit"])
+            credits = np.array([r[3] for r in rows], dtype=FIXED_COLUMNS["credit"])
+            order = np.argsort(dates, kind="stable")
+            existing = self._columns
+            pos = int(np.searchsorted(existing["date"], dates[order[0]], side="right"))
+            tail_count = self._count - pos
+
+            # Existing tail followed by the new rows, stably sorted by date so
+            # existing rows stay ahead of new ones on the same day.
+            columns = {
+                "date": np.concatenate([existing["date"][pos:], dates[order]]),
+                "debit": np.concatenate([existing["debit"][pos:], debits[order]]),
+                "credit": np.concatenate([existing["credit"][pos:], credits[order]]),
+            }
+            encoded = ([self._description(i).encode("utf-8") for i in range(pos, self._count)]
+                       + [rows[i][1].encode("utf-8") for i in order])
+            merge = np.argsort(columns["date"], kind="stable")
+            columns = {name: values[merge] for name, values in columns.items()}
+            encoded = [encoded[i] for i in merge]
+
+            if pos:
+                start_balance = float(np.nan_to_num(existing["balance"][pos - 1]))
+            else:
+                start_balance = self._opening_balance()
+            amounts = np.nan_to_num(columns["credit"]) + np.nan_to_num(columns["debit"])
+            columns["balance"] = np.round(start_balance + np.cumsum(amounts), 2)
+
+            self._write_tail(pos, columns, encoded)
+            self._track_balances(dates, np.nan_to_num(credits) + np.nan_to_num(debits))
+
+            positions = np.empty(len(rows), dtype=np.int64)
+            is_new = merge >= tail_count
+            positions[order[merge[is_new] - tail_count]] = pos + np.nonzero(is_new)[0]
+            return positions
+
+    def to_csv_text(self) -> str:
+        buffer = io.StringIO()
+        self._write_csv(buffer)
+        return buffer.getvalue()
+
+    def export_csv(self, csv_path: str):
+        with open(csv_path, "w", newline="") as f:
+            self._write_csv(f)
+
+    def _write_csv(self, f):
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(self.snapshot().rows())
+
+
+class LedgerSnapshot:
+    """
+    A ledger's rows as of one version, copied so that later writes can't
+    change them while they are read.
+
+    The fixed columns cover every row; descriptions are available from row
+    `start` on. `changed_from` is the first row written since the version the
+    snapshot was taken relative to (0 if none).
+    """
+
+    def __init__(self, version: int, start: int, changed_from: int,
+                 columns: Dict[str, np.ndarray], offsets: np.ndarray, blob: bytes):
+        self.version = version
+        self.start = start
+        self.changed_from = changed_from
+        self._columns = columns
+        self._offsets = offsets
+        self._blob = blob
+
+    def __len__(self) -> int:
+        return len(self._columns["date"])
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self._columns["date"]
+
+    @property
+    def debits(self) -> np.ndarray:
+        return self._columns["debit"]
+
+    @property
+    def credits(self) -> np.ndarray:
+        return self._columns["credit"]
+
+    @property
+    def balances(self) -> np.ndarray:
+        return self._columns["balance"]
+
+    def amounts(self, start: int = 0, end: Optional[int] = None) -> np.ndarray:
+        """Net amount of each row (credit + debit, debits being negative)."""
+        return (np.nan_to_num(self.credits[start:end], nan=0.0)
+                + np.nan_to_num(self.debits[start:end], nan=0.0))
+
+    def description(self, index: int) -> str:
+        i = index - self.start
+        if i < 0:
+            raise IndexError(f"Snapshot has descriptions from row {self.start} on, not {index}")
+        start = int(self._offsets[i - 1]) if i else 0
+        return self._blob[start:int(self._offsets[i])].decode("utf-8")
+
+    def rows(self) -> List[Dict[str, str]]:
+        """Rows in the CSV schema, with values formatted as in the CSV file."""
+        dates = self.dates
+        debits, credits, balances = self.debits, self.credits, self.balances
+        return [
+            {
+                "Date": format_date(dates[i]),
+                "Description": self.description(i),
+                "Debit": format_amount(debits[i]),
+                "Credit": format_amount(credits[i]),
+                "Balance": format_amount(balances[i]),
+            }
+            for i in range(len(self))
+        ]
+
+    def records(self) -> List[Dict]:
+        """Rows as JSON-ready dicts, empty amounts reported as 0 (the /transactions shape)."""
+        dates = [format_date(d) for d in self.dates]
+        debits = np.nan_to_num(self.debits, nan=0.0).tolist()
+        credits = np.nan_to_num(self.credits, nan=0.0).tolist()
+        balances = np.nan_to_num(self.balances, nan=0.0).tolist()
+        return [
+            {
+                "Date": dates[i],
+                "Description": self.description(i),
+                "Debit": debits[i],
+                "Credit": credits[i],
+                "Balance": balances[i],
+            }
+            for i in range(len(self))
+        ]
+
+
+def read_csv_rows(csv_path: str) -> List[tuple]:
+    """Reads a CSV in the ledger schema into append_many() tuples."""
+    rows = []
+    balance = 0.0
+    with open(csv_path, "r", newline="") as f:
+        for row in csv.DictReader(f):
+            debit = parse_amount(row.get("Debit"))
+            credit = parse_amount(row.get("Credit"))
+            if row.get("Balance", "").strip():
+                balance = float(row["Balance"])
+            else:
+                balance += np.nan_to_num(credit) + np.nan_to_num(debit)
+            rows.append((row["Date"], row["Description"], debit, credit, balance))
+    return rows
+
+
+def import_csv(csv_path: str, ledger_path: str) -> Ledger:
+    """Builds a fresh ledger from a CSV file, replacing any existing one atomically."""
+    tmp_path = ledger_path + ".tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    rows = read_csv_rows(csv_path)
+    dates = np.array([parse_date(r[0]) for r in rows], dtype=FIXED_COLUMNS["date"])
+    ledger = Ledger(tmp_path)
+    if not rows:
+        ledger._create()
+    elif np.all(dates[1:] >= dates[:-1]):
+        ledger.append_many(rows)
+    else:
+        # Out of date order: let the ledger sort it and recompute balances.
+        print(f"{csv_path} is not in date order, recomputing balances")
+        ledger.insert_many([r[:4] for r in rows])
+    if os.path.exists(ledger_path):
+        old_path = ledger_path + ".old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        os.rename(ledger_path, old_path)
+        os.rename(tmp_path, ledger_path)
+        shutil.rmtree(old_path)
+    else:
+        os.rename(tmp_path, ledger_path)
+    return Ledger(ledger_path)
+
+
+def open_ledger(ledger_path: str, csv_path: str = CSV_PATH) -> Ledger:
+    """Opens the ledger, seeding it from the CSV file the first time."""
+    if not os.path.exists(ledger_path) and os.path.exists(csv_path):
+        return import_csv(csv_path, ledger_path)
+    return Ledger(ledger_path)
+
+
+def main(argv: Optional[List[str]] = None):
+    # Default to the ledger the server reads for requests without a tenant.
+    from tenants import DEFAULT_TENANT, tenant_ledger_path
+    default_ledger = tenant_ledger_path(DEFAULT_TENANT)
+
+    parser = argparse.ArgumentParser(description="Convert between the CSV and binary ledger formats.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser("import", help="Build a ledger from a CSV file")
+    import_parser.add_argument("csv", nargs="?", default=CSV_PATH)
+    import_parser.add_argument("ledger", nargs="?", default=default_ledger)
+
+    export_parser = subparsers.add_parser("export", help="Write a ledger back out as CSV")
+    export_parser.add_argument("ledger", nargs="?", default=default_ledger)
+    export_parser.add_argument("csv", nargs="?", default=CSV_PATH)
+
+    args = parser.parse_args(argv)
+    if args.command == "import":
+        ledger = import_csv(args.csv, args.ledger)
+        print(f"Imported {len(ledger)} rows from {args.csv} into {args.ledger}")
+    else:
+        if not os.path.exists(os.path.join(args.ledger, META_FILE)):
+            parser.error(f"No ledger at {args.ledger}")
+        ledger = Ledger(args.ledger)
+        ledger.export_csv(args.csv)
+        print(f"Exported {len(ledger)} rows from {args.ledger} to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
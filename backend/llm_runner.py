@@ -1,51 +1,104 @@
+from __future__ import annotations
+
 import os
 import json
-import csv
 import asyncio
-from typing import List, Literal, Optional
+from typing import TYPE_CHECKING, Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 from typing_extensions import TypedDict
 from dotenv import load_dotenv
 from datetime import date
 
-# OpenAI and Exa imports
-from openai import AsyncOpenAI
-from openai.types.chat import ChatCompletionMessageParam, ChatCompletionToolParam
-from exa_py import Exa
-
 # Thesys imports
-from thread_store import Message, thread_store
+from thread_store import Message
+from categorizer import CATEGORIES
+from tenants import DEFAULT_TENANT, Tenant, tenants
+from startup_timing import timed
 from thesys_genui_sdk.context import get_assistant_message, write_content, write_think_item
 
 import nanoid
 
+# OpenAI and Exa are slow to import, so they are imported on first use (or
+# by the warm-up step) instead of at boot.
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from openai.types.chat import ChatCompletionMessageParam, ChatCompletionToolParam
+    from exa_py import Exa
+
 load_dotenv()
 
-# 1. Initialize Clients
-client = AsyncOpenAI(
-    api_key=os.getenv("THESYS_API_KEY"),
-    base_url="https://api.thesys.dev/v1/embed",
-)
+# 1. Clients, created on first use
+_client: Optional[AsyncOpenAI] = None
+_c1_artifacts_client: Optional[AsyncOpenAI] = None
+_exa: Optional[Exa] = None
+
+
+def _new_thesys_client(base_url: str) -> AsyncOpenAI:
+    with timed("import: openai"):
+        from openai import AsyncOpenAI
+    return AsyncOpenAI(api_key=os.getenv("THESYS_API_KEY"), base_url=base_url)
+
+
+def get_client() -> AsyncOpenAI:
+    global _client
+    if _client is None:
+        with timed("init: embed client (incl. openai import)"):
+            _client = _new_thesys_client("https://api.thesys.dev/v1/embed")
+    return _client
+
+
+def get_artifacts_client() -> AsyncOpenAI:
+    global _c1_artifacts_client
+    if _c1_artifacts_client is None:
+        with timed("init: artifacts client"):
+            _c1_artifacts_client = _new_thesys_client("https://api.thesys.dev/v1/artifact")
+    return _c1_artifacts_client
+
+
+def get_exa() -> Exa:
+    global _exa
+    if _exa is None:
+        with timed("init: exa client (incl. import)"):
+            from exa_py import Exa
+            _exa = Exa(api_key=os.getenv("EXA_API_KEY"))
+    return _exa
+
 
-c1_artifacts_client = AsyncOpenAI(
-    api_key=os.getenv("THESYS_API_KEY"),
-    base_url="https://api.thesys.dev/v1/artifact",
-)
+def transactions_csv(tenant: Tenant) -> str:
+    """The tenant's transactions ledger as CSV text, for the prompts."""
+    ledger = tenant.ledger
+    return ledger.to_csv_text() if len(ledger) else "No transaction data available."
 
 
-# Read student transactions CSV
-try:
-    with open("student_transactions.csv", "r") as f:
-        csv_content = f.read()
-except FileNotFoundError:
-    csv_content = "No transaction data available."
+def get_system_prompt(tenant: Tenant) -> Dict[str, str]:
+    """Builds the tenant's system prompt, and rebuilds it only when the date or the ledger changed."""
+    key = (date.today(), len(tenant.ledger))
+    if tenant.cache.get("system_prompt_key") != key:
+        with timed("init: system prompt"):
+            tenant.cache["system_prompt"] = {
+                "role": "system",
+                "content": SYSTEM_PROMPT_TEMPLATE.format(csv_content=transactions_csv(tenant), today=key[0]),
+            }
+        tenant.cache["system_prompt_key"] = key
+    return tenant.cache["system_prompt"]
+
+
+def warm_up_blocking():
+    """
+    Pays the first-use costs (heavy imports, clients, and the default
+    tenant's ledger, category labels and prompt) ahead of the first request.
+    Blocking; run it in a worker thread.
+    """
+    get_client()
+    get_artifacts_client()
+    get_exa()
+    with tenants.use(DEFAULT_TENANT) as tenant:
+        with timed("init: category labels"):
+            tenant.category_index.update()
+        get_system_prompt(tenant)
 
-today = date.today()
-print(today)
 
-SYSTEM_PROMPT = {
-    "role": "system",
-    "content": f"""
+SYSTEM_PROMPT_TEMPLATE = """
     You are a smart, helpful AI financial assistant for international students. Your goal is to analyze their bank statements {csv_content}, identify savings opportunities, and provide clear financial insights.
 
     **Role & Behavior:**
@@ -88,11 +141,11 @@ SYSTEM_PROMPT = {
     4. When the query explicitly asks to "search for" something.
 
     If unsure, rely on your internal knowledge first.
-    """
-}
 
-# Initialize Exa
-exa = Exa(api_key=os.getenv("EXA_API_KEY"))
+    **Category Totals:** For spending per category (e.g. food vs. transport), call 'get_category_breakdown' rather than adding up the transactions yourself.
+
+    **Balances:** For the balance on a specific date, call 'get_balance_on_date'.
+    """
 
 # 2. Define the Search Tool Schema
 tools: List[ChatCompletionToolParam] = [
@@ -153,6 +206,44 @@ tools: List[ChatCompletionToolParam] = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_category_breakdown",
+            "description": "Get total spent, received and transaction count per spending category (" + ", ".join(CATEGORIES) + "), optionally for a date range. Use this instead of adding up transactions yourself.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "start_date": {
+                        "type": "string",
+                        "description": "Inclusive start date (e.g., 'MM/DD/YYYY'). Omit for no lower bound."
+                    },
+                    "end_date": {
+                        "type": "string",
+                        "description": "Inclusive end date (e.g., 'MM/DD/YYYY'). Omit for no upper bound."
+                    }
+                },
+                "required": []
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_balance_on_date",
+            "description": "Get the account balance at the end of a given date. Use this instead of working balances out from the transactions yourself.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "date": {
+                        "type": "string",
+                        "description": "The date (e.g., 'MM/DD/YYYY')."
+                    }
+                },
+                "required": ["date"]
+            }
+        }
+    },
     {
         "type": "function",
         "function": {
@@ -195,68 +286,83 @@ create_presentation_tool = {
     },
 }
 
-async def add_transaction_to_csv(date: str, description: str, amount: float, transaction_type: str):
+async def add_transaction_to_csv(tenant: Tenant, date: str, description: str, amount: float, transaction_type: str):
     await write_think_item(
         title="Adding transaction...",
         description=f"Adding {transaction_type} of ${amount} for '{description}'"
     )
 
     try:
-        rows = []
-        with open("student_transactions.csv", "r") as f:
-            reader = csv.DictReader(f)
-            rows = list(reader)
-        
-        last_balance = 0.0
-        if rows:
-            # Handle potential empty strings or malformed data in CSV
-            try:
-                last_balance = float(rows[-1]['Balance'])
-            except ValueError:
-                last_balance = 0.0
-        
-        debit_val = ""
-        credit_val = ""
         amount = float(amount)
-        
+
         if transaction_type.lower() == 'debit':
-            debit_val = f"-{amount:.2f}"
-            new_balance = last_balance - amount
+            debit_val, credit_val = -amount, float("nan")
         else:
-            credit_val = f"{amount:.2f}"
-            new_balance = last_balance + amount
-            
-        new_row = {
-            "Date": date,
-            "Description": description,
-            "Debit": debit_val,
-            "Credit": credit_val,
-            "Balance": f"{new_balance:.2f}"
-        }
-        
-        with open("student_transactions.csv", "a", newline='') as f:
-            writer = csv.DictWriter(f, fieldnames=["Date","Description","Debit","Credit","Balance"])
-            writer.writerow(new_row)
-            
-        return json.dumps({"status": "success", "message": f"Added transaction. New Balance: {new_balance:.2f}"})
+            debit_val, credit_val = float("nan"), amount
+
+        # The insert syncs to disk and may wait for an import holding the
+        # ledger lock, so keep it off the event loop.
+        message = await asyncio.to_thread(_insert_transaction, tenant, date, description, debit_val, credit_val)
+        return json.dumps({"status": "success", "message": message})
+
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+def _insert_transaction(tenant: Tenant, date: str, description: str, debit_val: float, credit_val: float) -> str:
+    ledger = tenant.ledger
+    # Rows are kept in date order, so a back-dated transaction lands in
+    # the middle and the balances after it are updated.
+    row = ledger.insert(date, description, debit_val, credit_val)
+    category = tenant.category_index.label(row)
+
+    message = f"Added transaction ({category}). New Balance: {ledger.last_balance:.2f}"
+    later_rows = len(ledger) - 1 - row
+    if later_rows:
+        message += f" It was back-dated: the balance at the end of {date} is {ledger.balance_on(date):.2f}, and {later_rows} later balances were updated."
+    return message
+
+async def get_balance_on_date(tenant: Tenant, date: str):
+    await write_think_item(
+        title="Looking up balance...",
+        description=f"Finding the balance on {date}"
+    )
+
+    try:
+        balance = await asyncio.to_thread(lambda: tenant.ledger.balance_on(date))
+        return json.dumps({"date": date, "balance": balance})
+
+    except Exception as e:
+        return json.dumps({"error": str(e)})
+
+async def get_category_breakdown(tenant: Tenant, start_date: Optional[str] = None, end_date: Optional[str] = None):
+    await write_think_item(
+        title="Summarizing categories...",
+        description="Adding up spending per category"
+    )
+
+    try:
+        totals = await asyncio.to_thread(lambda: tenant.category_index.totals(start_date, end_date))
+        return json.dumps(totals)
 
     except Exception as e:
         return json.dumps({"error": str(e)})
 
-async def generate_spending_wrapped():
+async def generate_spending_wrapped(tenant: Tenant):
     artifact_id = nanoid.generate(size=10)
     message_id = nanoid.generate(size=10)
+    csv_content = await asyncio.to_thread(transactions_csv, tenant)
     instructions = f"Create slides summarizing the student's spending for 2025 based on the following transactions: {csv_content}"
-    artifact_stream = await c1_artifacts_client.chat.completions.create(
+    artifact_stream = await get_artifacts_client().chat.completions.create(
         model="c1/artifact/v-20251030",
         messages=[{"role": "user", "content": instructions}],
         metadata={"thesys": json.dumps({"c1_artifact_type": "slides", "id": artifact_id})},
         stream=True,
     )
-    async for delta in artifact_stream:
-        content = delta.choices[0].delta.content
-        if content:
-            await write_content(content)
+    async with artifact_stream:
+        async for delta in artifact_stream:
+            content = delta.choices[0].delta.content
+            if content:
+                await write_content(content)
     return f"Spending wrapped created with artifact_id: {artifact_id}, version: {message_id}"
 
 async def web_search(query: str):
@@ -268,8 +374,10 @@ async def web_search(query: str):
     print(f"Searching Exa for: {query}")
     
     try:
-        # Exa Search Execution
-        search_response = exa.search_and_contents(
+        # Exa Search Execution (the client is blocking, run it off the event
+        # loop so a client disconnect can cancel the wait)
+        search_response = await asyncio.to_thread(
+            get_exa().search_and_contents,
             query,
             num_results=3,
             text=True,
@@ -288,7 +396,9 @@ async def web_search(query: str):
     except Exception as e:
         return json.dumps({"error": str(e)})
 
-async def generate_stream(chat_request: ChatRequest):
+async def generate_stream(chat_request: ChatRequest, tenant: Tenant):
+    thread_store = tenant.thread_store
+
     # 1. Setup History
     conversation_history: List[ChatCompletionMessageParam] = thread_store.get_messages(chat_request.threadId)
     
@@ -296,7 +406,7 @@ async def generate_stream(chat_request: ChatRequest):
     if not conversation_history or conversation_history[0].get("role") != "system":
         # If no history, or first message isn't system, insert it.
         # Note: If history exists but lacks system prompt, this injects it safely.
-        conversation_history.insert(0, SYSTEM_PROMPT)
+        conversation_history.insert(0, await asyncio.to_thread(get_system_prompt, tenant))
     
     conversation_history.append(chat_request.prompt)
     
@@ -314,150 +424,188 @@ async def generate_stream(chat_request: ChatRequest):
 
     print(f"Starting generation loop for thread {chat_request.threadId}")
 
-    while current_turn < max_turns:
-        current_turn += 1
-        print(f"Turn {current_turn}/{max_turns}")
+    try:
+        while current_turn < max_turns:
+            current_turn += 1
+            print(f"Turn {current_turn}/{max_turns}")
         
-        # Call the LLM with tools enabled
-        stream = await client.chat.completions.create(
-            messages=conversation_history,
-            model="c1/anthropic/claude-sonnet-4/v-20250815",
-            stream=True,
-            tools=tools, 
-        )
-
-        tool_calls_buffer = {}
-        finish_reason = None
-        has_content = False
+            # Call the LLM with tools enabled
+            stream = await get_client().chat.completions.create(
+                messages=conversation_history,
+                model="c1/anthropic/claude-sonnet-4/v-20250815",
+                stream=True,
+                tools=tools, 
+            )
+
+            tool_calls_buffer = {}
+            finish_reason = None
+            has_content = False
         
-        # Iterate over the stream
-        async for chunk in stream:
-            delta = chunk.choices[0].delta
-            finish_reason = chunk.choices[0].finish_reason
-
-            # Case A: Model is speaking text (Final Answer)
-            if delta.content:
-                has_content = True
-                final_assistant_content += delta.content
-                await write_content(delta.content)
-                await asyncio.sleep(0)
-
-            # Case B: Model is calling a tool (Accumulate chunks)
-            if delta.tool_calls:
-                for tool_chunk in delta.tool_calls:
-
-                    index = tool_chunk.index
+            # Iterate over the stream (closed on exit, including cancellation)
+            async with stream:
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta
+                    finish_reason = chunk.choices[0].finish_reason
+
+                    # Case A: Model is speaking text (Final Answer)
+                    if delta.content:
+                        has_content = True
+                        final_assistant_content += delta.content
+                        await write_content(delta.content)
+                        await asyncio.sleep(0)
+
+                    # Case B: Model is calling a tool (Accumulate chunks)
+                    if delta.tool_calls:
+                        for tool_chunk in delta.tool_calls:
+
+                            index = tool_chunk.index
                     
-                    if index not in tool_calls_buffer:
-                        tool_calls_buffer[index] = {
-                            "id": tool_chunk.id,
-                            "function": {"name": "", "arguments": ""},
-                            "type": "function"
-                        }
+                            if index not in tool_calls_buffer:
+                                tool_calls_buffer[index] = {
+                                    "id": tool_chunk.id,
+                                    "function": {"name": "", "arguments": ""},
+                                    "type": "function"
+                                }
                     
-                    if tool_chunk.id:
-                        tool_calls_buffer[index]["id"] = tool_chunk.id
-                    if tool_chunk.function.name:
-                        tool_calls_buffer[index]["function"]["name"] += tool_chunk.function.name
-                    if tool_chunk.function.arguments:
-                        tool_calls_buffer[index]["function"]["arguments"] += tool_chunk.function.arguments
-
-        print(f"Turn {current_turn} finished. Reason: {finish_reason}. Content length: {len(final_assistant_content)}")
-
-        # 3. Handle End of Turn Logic
-        if finish_reason == "tool_calls":
-            print("Processing tool calls...")
-            # The model wants to search. 
+                            if tool_chunk.id:
+                                tool_calls_buffer[index]["id"] = tool_chunk.id
+                            if tool_chunk.function.name:
+                                tool_calls_buffer[index]["function"]["name"] += tool_chunk.function.name
+                            if tool_chunk.function.arguments:
+                                tool_calls_buffer[index]["function"]["arguments"] += tool_chunk.function.arguments
+
+            print(f"Turn {current_turn} finished. Reason: {finish_reason}. Content length: {len(final_assistant_content)}")
+
+            # 3. Handle End of Turn Logic
+            if finish_reason == "tool_calls":
+                print("Processing tool calls...")
+                # The model wants to search. 
             
-            # Reconstruct list of tool calls from buffer
-            complete_tool_calls = [
-                {
-                    "id": val["id"],
-                    "type": "function",
-                    "function": {
-                        "name": val["function"]["name"],
-                        "arguments": val["function"]["arguments"]
-                    }
-                } 
-                for val in tool_calls_buffer.values()
-            ]
-
-            # A. Add the Assistant's "Tool Call" request to history
-            conversation_history.append({
-                "role": "assistant",
-                "content": None,
-                "tool_calls": complete_tool_calls
-            })
-
-            # B. Execute Tools
-            for tool_call in complete_tool_calls:
-                fn_name = tool_call['function']['name']
-                fn_args = json.loads(tool_call['function']['arguments'])
-
-                if fn_name == "web_search":
-                    tool_output = await web_search(query=fn_args.get("query"))
-                    print(tool_output)
-                    # C. Add the "Tool Result" to history
-                    conversation_history.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call['id'],
-                        "content": tool_output
-                    })
-                    await asyncio.sleep(1)
+                # Reconstruct list of tool calls from buffer
+                complete_tool_calls = [
+                    {
+                        "id": val["id"],
+                        "type": "function",
+                        "function": {
+                            "name": val["function"]["name"],
+                            "arguments": val["function"]["arguments"]
+                        }
+                    } 
+                    for val in tool_calls_buffer.values()
+                ]
+
+                # A. Add the Assistant's "Tool Call" request to history
+                conversation_history.append({
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": complete_tool_calls
+                })
+
+                # B. Execute Tools
+                for tool_call in complete_tool_calls:
+                    fn_name = tool_call['function']['name']
+                    fn_args = json.loads(tool_call['function']['arguments'])
+
+                    if fn_name == "web_search":
+                        tool_output = await web_search(query=fn_args.get("query"))
+                        print(tool_output)
+                        # C. Add the "Tool Result" to history
+                        conversation_history.append({
+                            "role": "tool",
+                            "tool_call_id": tool_call['id'],
+                            "content": tool_output
+                        })
+                        await asyncio.sleep(1)
+                
+                    elif fn_name == "add_transaction":
+                        tool_output = await add_transaction_to_csv(
+                            tenant,
+                            date=fn_args.get("date"),
+                            description=fn_args.get("description"),
+                            amount=fn_args.get("amount"),
+                            transaction_type=fn_args.get("transaction_type")
+                        )
+                        print(tool_output)
+                        conversation_history.append({
+                            "role": "tool",
+                            "tool_call_id": tool_call['id'],
+                            "content": tool_output
+                        })
+                        await asyncio.sleep(1)
+                
+                    elif fn_name == "get_category_breakdown":
+                        tool_output = await get_category_breakdown(
+                            tenant,
+                            start_date=fn_args.get("start_date"),
+                            end_date=fn_args.get("end_date")
+                        )
+                        print(tool_output)
+                        conversation_history.append({
+                            "role": "tool",
+                            "tool_call_id": tool_call['id'],
+                            "content": tool_output
+                        })
+                        await asyncio.sleep(1)
                 
-                elif fn_name == "add_transaction":
-                    tool_output = await add_transaction_to_csv(
-                        date=fn_args.get("date"),
-                        description=fn_args.get("description"),
-                        amount=fn_args.get("amount"),
-                        transaction_type=fn_args.get("transaction_type")
-                    )
-                    print(tool_output)
-                    conversation_history.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call['id'],
-                        "content": tool_output
-                    })
-                    await asyncio.sleep(1)
+                    elif fn_name == "get_balance_on_date":
+                        tool_output = await get_balance_on_date(tenant, date=fn_args.get("date"))
+                        print(tool_output)
+                        conversation_history.append({
+                            "role": "tool",
+                            "tool_call_id": tool_call['id'],
+                            "content": tool_output
+                        })
+                        await asyncio.sleep(1)
                 
-                elif fn_name == "generate_spending_wrapped":
-                    tool_output = await generate_spending_wrapped()
-                    print(tool_output)
-                    conversation_history.append({
-                        "role": "tool",
-                        "tool_call_id": tool_call['id'],
-                        "content": tool_output
-                    })
-                    await asyncio.sleep(1)
-
-            # D. Loop continues -> The LLM will now see the search results and generate the text response
-            continue
+                    elif fn_name == "generate_spending_wrapped":
+                        tool_output = await generate_spending_wrapped(tenant)
+                        print(tool_output)
+                        conversation_history.append({
+                            "role": "tool",
+                            "tool_call_id": tool_call['id'],
+                            "content": tool_output
+                        })
+                        await asyncio.sleep(1)
+
+                # D. Loop continues -> The LLM will now see the search results and generate the text response
+                continue
         
-        elif finish_reason == "stop":
-            print("Generation finished.")
-            # The model is done generating the final answer.
+            elif finish_reason == "stop":
+                print("Generation finished.")
+                # The model is done generating the final answer.
             
-            # Construct final assistant message for storage
-            final_msg = {
-                "role": "assistant",
-                "content": final_assistant_content
-            }
+                # Construct final assistant message for storage
+                final_msg = {
+                    "role": "assistant",
+                    "content": final_assistant_content
+                }
+            
+                # Add to history if not already there (it might be redundant if we just streamed it)
+                if conversation_history[-1].get("role") != "assistant":
+                    conversation_history.append(final_msg)
             
-            # Add to history if not already there (it might be redundant if we just streamed it)
-            if conversation_history[-1].get("role") != "assistant":
-                conversation_history.append(final_msg)
+                # Save to persistent storage
+                thread_store.append_message(chat_request.threadId, Message(
+                    openai_message=final_msg,
+                    id=chat_request.responseId
+                ))
             
-            # Save to persistent storage
+                break
+        
+            else:
+                print(f"Unknown finish reason: {finish_reason}. Breaking loop.")
+                break
+
+    except asyncio.CancelledError:
+        # The SSE client went away. Stop here (no further turns or tools), but
+        # keep whatever the user already saw so the thread reloads consistently.
+        print(f"Client disconnected from thread {chat_request.threadId} on turn {current_turn}.")
+        if final_assistant_content:
             thread_store.append_message(chat_request.threadId, Message(
-                openai_message=final_msg,
+                openai_message={"role": "assistant", "content": final_assistant_content},
                 id=chat_request.responseId
             ))
-            
-            break
-        
-        else:
-            print(f"Unknown finish reason: {finish_reason}. Breaking loop.")
-            break
-    
+        raise
+
     if current_turn >= max_turns:
         print("Max turns reached.")
\ No newline at end of file
@@ -1,32 +1,66 @@
-from fastapi import FastAPI, HTTPException, Body, Request
-from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
-from llm_runner import generate_stream, ChatRequest
-from thesys_genui_sdk.fast_api import with_c1_response
-from thesys_genui_sdk.context import write_content
-from thread_store import thread_store
+from startup_timing import timed, mark, startup_report, print_startup_report
+
+with timed("import: fastapi"):
+    from fastapi import FastAPI, HTTPException, Body, Request, Header, Depends
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import StreamingResponse
+    from starlette.middleware.base import BaseHTTPMiddleware
+    from starlette.concurrency import run_in_threadpool
+
+with timed("import: app modules"):
+    from llm_runner import generate_stream, ChatRequest, get_artifacts_client, transactions_csv, warm_up_blocking
+    from c1_streaming import with_c1_response
+    from thesys_genui_sdk.context import write_content
+    from tenants import DEFAULT_TENANT, THREADS_SAVE_SECONDS, tenants, validate_tenant_id
+    from statement_import import import_statement
+
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
-from typing import List, Dict, Any
-import pandas as pd
-from openai import AsyncOpenAI
+from typing import List, Dict, Any, Optional
 import nanoid
+import asyncio
 import json
 import os
-import httpx 
-from fastapi.responses import StreamingResponse
+import tempfile
 
-app = FastAPI()
 
-c1_artifacts_client = AsyncOpenAI(
-    api_key=os.getenv("THESYS_API_KEY"),
-    base_url="https://api.thesys.dev/v1/artifact",
-)
-
-try:
-    with open("student_transactions.csv", "r") as f:
-        csv_content = f.read()
-except FileNotFoundError:
-    csv_content = "No transaction data available."
+async def warm_up():
+    try:
+        await asyncio.to_thread(warm_up_blocking)
+        mark("warm-up complete")
+    except Exception as e:
+        # Everything warmed here is also created on first use, so just report it.
+        print(f"Warm-up failed: {e}")
+    print_startup_report()
+
+
+async def save_threads_periodically():
+    while True:
+        await asyncio.sleep(THREADS_SAVE_SECONDS)
+        try:
+            await asyncio.to_thread(tenants.save_all)
+        except Exception as e:
+            print(f"Error saving threads: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm up in the background, so the server starts accepting connections
+    # right away instead of after the heavy imports. WARMUP_ON_STARTUP=0
+    # leaves everything to first use.
+    mark("app loaded")
+    warmup_task = None
+    if os.getenv("WARMUP_ON_STARTUP", "1") != "0":
+        warmup_task = asyncio.create_task(warm_up())
+    save_task = asyncio.create_task(save_threads_periodically())
+    yield
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    save_task.cancel()
+    await asyncio.to_thread(tenants.save_all)
+
+
+app = FastAPI(lifespan=lifespan)
 
 # --- FIX 1: Add No-Buffering Middleware ---
 # This forces every response to have headers that disable buffering.
@@ -56,27 +90,78 @@ app.add_middleware(
 def read_root():
     return {"status": "ok"}
 
+@app.get("/startup")
+def get_startup_report():
+    return startup_report()
+
+def get_tenant_id(x_tenant_id: Optional[str] = Header(None)) -> str:
+    """The tenant (student) a request is for, from the X-Tenant-Id header."""
+    try:
+        return validate_tenant_id(x_tenant_id or DEFAULT_TENANT)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.get("/transactions")
-def get_transactions():
+def get_transactions(tenant_id: str = Depends(get_tenant_id)):
     try:
-        df = pd.read_csv("student_transactions.csv")
-        # Clean up data for JSON serialization (handle NaN)
-        df = df.fillna(0)
-        return df.to_dict(orient="records")
+        with tenants.use(tenant_id) as tenant:
+            # Empty Debit/Credit cells come back as 0 for JSON serialization
+            return tenant.category_index.records()
     except Exception as e:
         print(f"Error reading transactions: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Uploads are spooled in memory up to this size, then to a temp file.
+IMPORT_SPOOL_BYTES = 1024 * 1024
+MAX_IMPORT_BYTES = 50 * 1024 * 1024
+
+@app.post("/transactions/import")
+async def import_transactions(request: Request, filename: Optional[str] = None, date_format: Optional[str] = None,
+                              tenant_id: str = Depends(get_tenant_id)):
+    """
+    Bulk-imports a CSV/XLSX bank statement sent as the raw request body.
+    Rows already in the ledger (same date, description and amount) are skipped.
+    date_format (DD/MM/YYYY or MM/DD/YYYY) is only needed when the file's
+    dates don't show which comes first.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as upload:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > MAX_IMPORT_BYTES:
+                raise HTTPException(status_code=413, detail="Statement is too large")
+            upload.write(chunk)
+        if not size:
+            raise HTTPException(status_code=400, detail="Empty statement")
+        upload.seek(0)
+        try:
+            async with tenants.use_async(tenant_id) as tenant:
+                return await run_in_threadpool(import_statement, tenant.ledger, upload, filename, date_format)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/categories")
+def get_categories(start_date: Optional[str] = None, end_date: Optional[str] = None, tenant_id: str = Depends(get_tenant_id)):
+    try:
+        with tenants.use(tenant_id) as tenant:
+            return tenant.category_index.totals(start_date, end_date)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/chat")
 @with_c1_response()
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, tenant_id: str = Depends(get_tenant_id)):
     # Ensure your llm_runner.py has 'await asyncio.sleep(0)' 
     # inside the text generation loop as well!
-    await generate_stream(request)
+    # The tenant stays pinned (not evictable) until the stream ends.
+    async with tenants.use_async(tenant_id) as tenant:
+        await generate_stream(request, tenant)
 
 @app.post("/generate-spending-wrapped")
 @with_c1_response()
-async def generate_spending_wrapped_endpoint():
+async def generate_spending_wrapped_endpoint(tenant_id: str = Depends(get_tenant_id)):
+    async with tenants.use_async(tenant_id) as tenant:
+        csv_content = await run_in_threadpool(transactions_csv, tenant)
     prompt = f""" You are an AI presentation generator that creates a monthly “Wrapped-style” financial storytelling deck from bank transaction data: {csv_content}.
 
 Your goal is to turn raw financial transactions into:
@@ -122,16 +207,19 @@ Think:
 “Best friend who exposes your spending habits but still loves you.”
 """
     artifact_id = nanoid.generate(size=10)
-    artifact_stream = await c1_artifacts_client.chat.completions.create(
+    artifact_stream = await get_artifacts_client().chat.completions.create(
         model="c1/artifact/v-20251030",
         messages=[{"role": "user", "content": prompt}],
         metadata={"thesys": json.dumps({"c1_artifact_type": "slides", "id": artifact_id})},
         stream=True,
     )
-    async for delta in artifact_stream:
-        content = delta.choices[0].delta.content
-        if content:
-            await write_content(content)
+    # Closing the stream on exit also releases the upstream socket when the
+    # client disconnects and this task gets cancelled.
+    async with artifact_stream:
+        async for delta in artifact_stream:
+            content = delta.choices[0].delta.content
+            if content:
+                await write_content(content)
 
 
 @app.post("/api/export-pdf")
@@ -147,6 +235,8 @@ async def export_artifact_as_pdf(request: Request):
         "Content-Type": "application/json",
     }
     
+    import httpx
+
     async with httpx.AsyncClient() as client:
         # Use a streaming request to handle large files
         async with client.stream(
@@ -176,28 +266,33 @@ class UpdateThreadRequest(BaseModel):
     name: str
 
 @app.get("/threads")
-def get_threads():
-    return thread_store.list_threads()
+def get_threads(tenant_id: str = Depends(get_tenant_id)):
+    with tenants.use(tenant_id) as tenant:
+        return tenant.thread_store.list_threads()
 
 @app.post("/thread")
-def create_thread(req: CreateThreadRequest):
-    return thread_store.create_thread(req.name)
+def create_thread(req: CreateThreadRequest, tenant_id: str = Depends(get_tenant_id)):
+    with tenants.use(tenant_id) as tenant:
+        return tenant.thread_store.create_thread(req.name)
 
 @app.delete("/thread/{thread_id}")
-def delete_thread(thread_id: str):
-    thread_store.delete_thread(thread_id)
+def delete_thread(thread_id: str, tenant_id: str = Depends(get_tenant_id)):
+    with tenants.use(tenant_id) as tenant:
+        tenant.thread_store.delete_thread(thread_id)
     return {"status": "deleted"}
 
 @app.put("/thread/{thread_id}")
-def update_thread(thread_id: str, req: UpdateThreadRequest):
-    t = thread_store.update_thread(thread_id, req.name)
+def update_thread(thread_id: str, req: UpdateThreadRequest, tenant_id: str = Depends(get_tenant_id)):
+    with tenants.use(tenant_id) as tenant:
+        t = tenant.thread_store.update_thread(thread_id, req.name)
     if not t:
         raise HTTPException(status_code=404, detail="Thread not found")
     return t
 
 @app.get("/thread/{thread_id}/messages")
-def get_thread_messages(thread_id: str):
-    messages = thread_store.get_messages_all(thread_id)
+def get_thread_messages(thread_id: str, tenant_id: str = Depends(get_tenant_id)):
+    with tenants.use(tenant_id) as tenant:
+        messages = tenant.thread_store.get_messages_all(thread_id)
     ui_messages = []
     for msg in messages:
         openai_msg = msg.get('openai_message', {})
@@ -217,7 +312,7 @@ def get_thread_messages(thread_id: str):
     return ui_messages
 
 @app.post("/thread/{thread_id}/message")
-def add_message(thread_id: str, message: Dict[str, Any] = Body(...)):
+def add_message(thread_id: str, message: Dict[str, Any] = Body(...), tenant_id: str = Depends(get_tenant_id)):
     msg_id = message.get('id')
     openai_msg = message.copy()
     if 'id' in openai_msg:
@@ -227,11 +322,12 @@ def add_message(thread_id: str, message: Dict[str, Any] = Body(...)):
         "openai_message": openai_msg,
         "id": msg_id
     }
-    thread_store.append_message(thread_id, stored_msg)
+    with tenants.use(tenant_id) as tenant:
+        tenant.thread_store.append_message(thread_id, stored_msg)
     return {"message": "added"}
 
 @app.put("/thread/{thread_id}/message")
-def update_message(thread_id: str, message: Dict[str, Any] = Body(...)):
+def update_message(thread_id: str, message: Dict[str, Any] = Body(...), tenant_id: str = Depends(get_tenant_id)):
     msg_id = message.get('id')
     openai_msg = message.copy()
     if 'id' in openai_msg:
@@ -241,5 +337,6 @@ def update_message(thread_id: str, message: Dict[str, Any] = Body(...)):
         "openai_message": openai_msg,
         "id": msg_id
     }
-    thread_store.update_message(thread_id, stored_msg)
+    with tenants.use(tenant_id) as tenant:
+        tenant.thread_store.update_message(thread_id, stored_msg)
     return {"message": "updated"}
\ No newline at end of file
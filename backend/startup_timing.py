@@ -0,0 +1,35 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+# Imported first by main.py, so this is (roughly) when the app started loading.
+_process_start = time.perf_counter()
+_timings: Dict[str, float] = {}
+
+
+@contextmanager
+def timed(step: str) -> Iterator[None]:
+    """
+    Records how long the first run of `step` took, in milliseconds. Later runs
+    are not recorded, so lazy getters can wrap their first-use work in it.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _timings.setdefault(step, round((time.perf_counter() - start) * 1000, 1))
+
+
+def mark(step: str):
+    """Records the time since the app started loading, e.g. when it is ready to serve."""
+    _timings.setdefault(step, round((time.perf_counter() - _process_start) * 1000, 1))
+
+
+def startup_report() -> Dict[str, Dict[str, float]]:
+    return {"steps_ms": dict(_timings)}
+
+
+def print_startup_report():
+    print("Startup time report (ms):")
+    for step, ms in sorted(_timings.items(), key=lambda item: -item[1]):
+        print(f"  {ms:>9.1f}  {step}")
@@ -0,0 +1,329 @@
+import io
+import re
+import csv
+from collections import Counter
+from contextlib import closing
+from datetime import date, datetime
+from typing import IO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ledger import Ledger, parse_date
+
+# Rows are committed to the ledger in batches of this size, so memory stays
+# bounded no matter how long the statement is.
+BATCH_SIZE = 1000
+
+# How many leading rows to search for the header (bank exports often start
+# with account details before the table).
+HEADER_SEARCH_ROWS = 20
+
+XLSX_MAGIC = b"PK\x03\x04"
+
+# Normalized header names (lowercase, letters and digits only) per ledger field.
+COLUMN_ALIASES: Dict[str, List[str]] = {
+    "date": ["date", "transactiondate", "txndate", "trandate", "posteddate", "postingdate", "valuedate", "valuedt", "bookingdate"],
+    "description": [
+        "description", "details", "narration", "memo", "payee", "merchant", "particulars", "transactiondetails",
+        "transactionremarks", "remarks",
+    ],
+    "debit": [
+        "debit", "debits", "withdrawal", "withdrawals", "moneyout", "paidout", "debitamount", "debitamt",
+        "withdrawalamt", "withdrawalamount", "withdrawalamountinr", "debitamountinr", "dr",
+    ],
+    "credit": [
+        "credit", "credits", "deposit", "deposits", "moneyin", "paidin", "creditamount", "creditamt",
+        "depositamt", "depositamount", "depositamountinr", "creditamountinr", "cr",
+    ],
+    "amount": ["amount", "transactionamount", "amountinr", "value"],
+}
+
+# Orders for numeric dates such as 05/01/2026, named after how they are
+# passed in the date_format query parameter.
+MONTH_FIRST = "MM/DD/YYYY"
+DAY_FIRST = "DD/MM/YYYY"
+DATE_ORDERS = (MONTH_FIRST, DAY_FIRST)
+
+_NUMERIC_DATE = re.compile(r"^\s*(\d{1,2})[/.\-](\d{1,2})[/.\-](\d{4}|\d{2})\s*$")
+
+_HEADER_CLEAN = re.compile(r"[^a-z0-9]")
+
+
+class ColumnMap:
+    """Positions of the ledger fields in a statement's header row."""
+
+    def __init__(self, header: Sequence):
+        normalized = [_HEADER_CLEAN.sub("", str(cell or "").lower()) for cell in header]
+        self.positions: Dict[str, int] = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            for i, name in enumerate(normalized):
+                if name in aliases:
+                    self.positions[field] = i
+                    break
+        self.header = [str(cell or "") for cell in header]
+
+    @property
+    def is_valid(self) -> bool:
+        has_amount = "amount" in self.positions or "debit" in self.positions or "credit" in self.positions
+        return "date" in self.positions and "description" in self.positions and has_amount
+
+    def describe(self) -> Dict[str, str]:
+        return {field: self.header[i] for field, i in self.positions.items()}
+
+    def cell(self, row: Sequence, field: str):
+        i = self.positions.get(field)
+        if i is None or i >= len(row):
+            return None
+        return row[i]
+
+
+def parse_statement_amount(value) -> float:
+    """
+    Parses '1,234.56', '$12', '(12.00)' and '12.50-' (both negative) and plain
+    numbers; blank is NaN. Raises ValueError for anything else.
+    """
+    if value is None:
+        return float("nan")
+    if isinstance(value, (int, float)):
+        return float(value)
+    text = str(value).strip()
+    if not text or text == "-":
+        return float("nan")
+    negative = text.startswith("(") and text.endswith(")")
+    if text.endswith("-"):
+        negative = True
+        text = text[:-1]
+    text = re.sub(r"[^0-9.\-]", "", text)
+    if not text:
+        return float("nan")
+    amount = float(text)
+    return -abs(amount) if negative else amount
+
+
+def parse_statement_date(value, date_order: Optional[str] = None) -> np.datetime64:
+    """
+    Parses a date cell. Numeric dates (05/01/2026) are read in `date_order`,
+    month first if not given; other text goes through the ledger's formats.
+    """
+    if isinstance(value, datetime):
+        value = value.date()
+    if isinstance(value, date):
+        return np.datetime64(value, "D")
+    m = _NUMERIC_DATE.match(str(value))
+    if not m:
+        return parse_date(str(value))
+    first, second, year = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    if len(m.group(3)) == 2:
+        # Same pivot as strptime's %y.
+        year += 2000 if year < 69 else 1900
+    day, month = (first, second) if date_order == DAY_FIRST else (second, first)
+    return np.datetime64(date(year, month, day), "D")
+
+
+def detect_date_order(columns: "ColumnMap", rows: Iterator[Sequence]) -> Optional[str]:
+    """
+    Works out whether the statement's numeric dates are day or month first,
+    reading rows until one settles it (a first field over 12 means day first).
+    Returns None if there are no numeric dates (or the cells hold real dates),
+    and raises ValueError if they are all ambiguous.
+    """
+    ambiguous = False
+    for row in rows:
+        value = columns.cell(row, "date")
+        if isinstance(value, date):
+            # Spreadsheet with real date cells: nothing to guess.
+            return None
+        m = _NUMERIC_DATE.match(str(value or ""))
+        if not m:
+            continue
+        first, second = int(m.group(1)), int(m.group(2))
+        if first > 12:
+            return DAY_FIRST
+        if second > 12:
+            return MONTH_FIRST
+        ambiguous = True
+    if ambiguous:
+        raise ValueError(
+            "Can't tell whether the dates are day or month first; pass date_format=DD/MM/YYYY or MM/DD/YYYY"
+        )
+    return None
+
+
+def to_ledger_row(columns: ColumnMap, row: Sequence, date_order: Optional[str] = None) -> Optional[Tuple[np.datetime64, str, float, float]]:
+    """
+    Maps a statement row to (date, description, debit, credit), debit being
+    negative and NaN meaning "not applicable". Returns None for rows without
+    a valid date or amount (totals, blank lines, footers, garbled cells).
+    """
+    raw_date = columns.cell(row, "date")
+    if raw_date is None or not str(raw_date).strip():
+        return None
+    try:
+        day = parse_statement_date(raw_date, date_order)
+    except ValueError:
+        return None
+
+    try:
+        debit = parse_statement_amount(columns.cell(row, "debit"))
+        credit = parse_statement_amount(columns.cell(row, "credit"))
+        amount = float("nan")
+        if np.isnan(debit) and np.isnan(credit):
+            amount = parse_statement_amount(columns.cell(row, "amount"))
+    except ValueError:
+        return None
+    if np.isnan(debit) and np.isnan(credit):
+        if np.isnan(amount):
+            return None
+        if amount < 0:
+            debit = amount
+        else:
+            credit = amount
+    # Withdrawal columns usually hold positive numbers.
+    if not np.isnan(debit):
+        debit = -abs(debit)
+    if not np.isnan(credit):
+        credit = abs(credit)
+    if not np.isnan(debit) and not np.isnan(credit):
+        # Both filled: keep whichever is non-zero.
+        if debit == 0:
+            debit = float("nan")
+        elif credit == 0:
+            credit = float("nan")
+
+    description = str(columns.cell(row, "description") or "").strip()
+    return day, description, debit, credit
+
+
+def _duplicate_key(day: np.datetime64, description: str, amount: float) -> Tuple[int, str, int]:
+    return int(day.astype(np.int64)), description.strip().upper(), int(round(amount * 100))
+
+
+class DuplicateIndex:
+    """
+    Hash index of (date, description, amount) over the ledger rows.
+
+    Counts are kept per key, so a statement that legitimately has the same
+    coffee twice on one day only skips as many copies as the ledger has.
+    """
+
+    def __init__(self, ledger: Ledger):
+        snapshot = ledger.snapshot()
+        days = snapshot.dates
+        amounts = snapshot.amounts()
+        self._counts = Counter(
+            _duplicate_key(days[i], snapshot.description(i), amounts[i]) for i in range(len(snapshot))
+        )
+
+    def seen(self, day: np.datetime64, description: str, amount: float) -> bool:
+        """True if this row is already in the ledger (and uses up that match)."""
+        key = _duplicate_key(day, description, amount)
+        if self._counts[key] > 0:
+            self._counts[key] -= 1
+            return True
+        return False
+
+
+def detect_format(f: IO[bytes], filename: Optional[str] = None) -> str:
+    """Detects 'xlsx' from the ZIP magic bytes, like the frontend sheet processor; CSV otherwise."""
+    magic = f.read(len(XLSX_MAGIC))
+    f.seek(0)
+    if magic == XLSX_MAGIC:
+        return "xlsx"
+    if filename and filename.lower().endswith((".xlsx", ".xlsm")):
+        raise ValueError(f"{filename} does not look like a valid Excel file")
+    return "csv"
+
+
+def iter_statement_rows(f: IO[bytes], file_format: str) -> Iterator[Sequence]:
+    """Yields the raw rows of the first sheet one at a time, without loading the whole file."""
+    if file_format == "xlsx":
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise ValueError("XLSX import requires the openpyxl package")
+        workbook = load_workbook(f, read_only=True, data_only=True)
+        try:
+            yield from workbook.worksheets[0].iter_rows(values_only=True)
+        finally:
+            workbook.close()
+    else:
+        text = io.TextIOWrapper(f, encoding="utf-8-sig", errors="replace", newline="")
+        try:
+            yield from csv.reader(text)
+        finally:
+            text.detach()
+
+
+def import_statement(ledger: Ledger, f: IO[bytes], filename: Optional[str] = None,
+                     date_format: Optional[str] = None) -> Dict:
+    """
+    Imports a CSV/XLSX bank statement into the ledger.
+
+    Columns are mapped to the ledger schema by header name, rows already in
+    the ledger are skipped, and new rows are inserted in batches in date
+    order. Balances are recomputed by the ledger, not taken from the file.
+    Numeric dates are read in `date_format` (one of DATE_ORDERS), detected
+    from the file if not given.
+    """
+    if date_format is not None and date_format not in DATE_ORDERS:
+        raise ValueError(f"date_format must be one of {', '.join(DATE_ORDERS)}")
+    file_format = detect_format(f, filename)
+    # Readers are closed explicitly, so they are released before the caller
+    # closes `f`, also when the import fails.
+    if date_format is None:
+        # Read ahead (usually a few rows) to find the date order, then start over.
+        with closing(iter_statement_rows(f, file_format)) as rows:
+            date_format = detect_date_order(_read_header(rows), rows)
+        f.seek(0)
+    with closing(iter_statement_rows(f, file_format)) as rows:
+        return _import_rows(ledger, _read_header(rows), rows, date_format)
+
+
+def _read_header(rows: Iterator[Sequence]) -> ColumnMap:
+    """Finds the header row, leaving `rows` positioned after it."""
+    for _, header in zip(range(HEADER_SEARCH_ROWS), rows):
+        columns = ColumnMap(header)
+        if columns.is_valid:
+            return columns
+    raise ValueError(
+        "Could not find a header row with date, description and amount (or debit/credit) columns"
+    )
+
+
+def _import_rows(ledger: Ledger, columns: ColumnMap, rows: Iterator[Sequence], date_order: Optional[str]) -> Dict:
+    duplicates = DuplicateIndex(ledger)
+    imported = skipped = duplicate_count = batches = 0
+    batch: List[tuple] = []
+
+    def commit():
+        nonlocal imported, batches
+        ledger.insert_many(batch)
+        imported += len(batch)
+        batches += 1
+        batch.clear()
+
+    for row in rows:
+        parsed = to_ledger_row(columns, row, date_order)
+        if parsed is None:
+            skipped += 1
+            continue
+        day, description, debit, credit = parsed
+        amount = np.nan_to_num(debit) + np.nan_to_num(credit)
+        if duplicates.seen(day, description, amount):
+            duplicate_count += 1
+            continue
+        batch.append((str(day), description, debit, credit))
+        if len(batch) >= BATCH_SIZE:
+            commit()
+    if batch:
+        commit()
+
+    return {
+        "imported": imported,
+        "duplicates": duplicate_count,
+        "skipped": skipped,
+        "batches": batches,
+        "columns": columns.describe(),
+        "date_format": date_order,
+        "balance": ledger.last_balance,
+    }
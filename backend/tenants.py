@@ -0,0 +1,216 @@
+import os
+import re
+import asyncio
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from ledger import CSV_PATH, LEGACY_LEDGER_PATH, Ledger, open_ledger
+from categorizer import CategoryIndex
+from thread_store import ThreadStore
+from startup_timing import timed
+
+# Every tenant (student) gets a directory here holding its ledger and threads.
+TENANTS_DIR = os.getenv("TENANTS_DIR", "tenants")
+
+# Requests without a tenant id use this one. It is seeded with the demo
+# student_transactions.csv, like the single-tenant backend was.
+DEFAULT_TENANT = "default"
+
+# How many tenants are kept loaded; the least recently used idle ones beyond
+# this are saved to disk and dropped.
+MAX_LOADED_TENANTS = int(os.getenv("MAX_LOADED_TENANTS", "128"))
+
+# How often changed chat threads of loaded tenants are written to disk, so a
+# crash loses at most this many seconds of conversations.
+THREADS_SAVE_SECONDS = float(os.getenv("THREADS_SAVE_SECONDS", "5"))
+
+_TENANT_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def tenant_ledger_path(tenant_id: str) -> str:
+    return os.path.join(TENANTS_DIR, tenant_id, "transactions.ledger")
+
+
+def validate_tenant_id(tenant_id: str) -> str:
+    """Tenant ids become directory names, so only allow a safe character set."""
+    if not _TENANT_ID.match(tenant_id):
+        raise ValueError("Tenant id must be 1-64 letters, digits, '-' or '_'")
+    return tenant_id
+
+
+class Tenant:
+    """
+    One student's data: transaction ledger, category labels and chat threads.
+
+    load() reads the threads from disk and opens the ledger (memory-mapped).
+    Nothing is written to the tenant's directory (or the directory created)
+    until it has data. unload() writes the threads back.
+    """
+
+    def __init__(self, tenant_id: str):
+        self.id = tenant_id
+        self.path = os.path.join(TENANTS_DIR, tenant_id)
+        # Requests currently using this tenant; guarded by the registry lock.
+        self.users = 0
+        # Data derived from the tenant (e.g. the rendered system prompt),
+        # dropped along with it.
+        self.cache: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._ledger: Optional[Ledger] = None
+        self._category_index: Optional[CategoryIndex] = None
+        self.thread_store: Optional[ThreadStore] = None
+
+    def load(self):
+        """Reads the tenant's data from disk, the first time it is called. Blocking."""
+        with self._lock:
+            if self.thread_store is None:
+                self.thread_store = ThreadStore(os.path.join(self.path, "threads.json"))
+        self.ledger
+
+    @property
+    def ledger(self) -> Ledger:
+        if self._ledger is None:
+            with self._lock:
+                if self._ledger is None:
+                    with timed("init: ledger"):
+                        self._ledger = self._open_ledger()
+        return self._ledger
+
+    def _open_ledger(self) -> Ledger:
+        ledger_path = tenant_ledger_path(self.id)
+        if self.id != DEFAULT_TENANT:
+            return Ledger(ledger_path)
+        if not os.path.exists(ledger_path) and os.path.exists(LEGACY_LEDGER_PATH):
+            # Ledger of a single-tenant deployment: it belongs to the default tenant.
+            os.makedirs(self.path, exist_ok=True)
+            os.rename(LEGACY_LEDGER_PATH, ledger_path)
+        return open_ledger(ledger_path, CSV_PATH)
+
+    @property
+    def category_index(self) -> CategoryIndex:
+        if self._category_index is None:
+            ledger = self.ledger
+            with self._lock:
+                if self._category_index is None:
+                    self._category_index = CategoryIndex(ledger)
+        return self._category_index
+
+    def unload(self):
+        """Writes the threads back and drops everything held in memory. Blocking."""
+        if self.thread_store is not None:
+            self.thread_store.save()
+        self._ledger = None
+        self._category_index = None
+        self.cache.clear()
+
+
+class TenantRegistry:
+    """
+    Size-bounded LRU of loaded tenants.
+
+    use() loads a tenant on demand and pins it for the duration of the block,
+    so a tenant is never evicted while a request (e.g. a chat stream) still
+    works on it. When more than `max_loaded` tenants are loaded, the least
+    recently used unpinned ones are saved to disk and dropped as new tenants
+    come in.
+
+    The registry lock only guards the LRU itself: loading and saving happen
+    outside it, so one tenant's disk I/O doesn't hold up requests for others.
+    """
+
+    def __init__(self, max_loaded: int):
+        self.max_loaded = max_loaded
+        self._tenants: "OrderedDict[str, Tenant]" = OrderedDict()
+        # Evicted tenants whose threads are still being written, by id.
+        self._unloading: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def use(self, tenant_id: str) -> Iterator[Tenant]:
+        """Pins the tenant for the block. Loading blocks, so async code uses use_async()."""
+        tenant = self._acquire(tenant_id)
+        try:
+            yield tenant
+        finally:
+            self._release(tenant)
+
+    @asynccontextmanager
+    async def use_async(self, tenant_id: str) -> AsyncIterator[Tenant]:
+        """use() for the event loop: loading and evictions run in a worker thread."""
+        acquiring = asyncio.ensure_future(asyncio.to_thread(self._acquire, tenant_id))
+        try:
+            tenant = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The load still finishes in its thread; unpin the tenant once it has.
+            acquiring.add_done_callback(self._release_acquired)
+            raise
+        try:
+            yield tenant
+        finally:
+            self._release(tenant)
+
+    def _acquire(self, tenant_id: str) -> Tenant:
+        tenant_id = validate_tenant_id(tenant_id)
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None:
+                tenant = self._tenants[tenant_id] = Tenant(tenant_id)
+            else:
+                self._tenants.move_to_end(tenant_id)
+            tenant.users += 1
+            evicted = self._evict()
+            unloading = self._unloading.get(tenant_id)
+        try:
+            self._unload(evicted)
+            if unloading is not None:
+                # Evicted a moment ago: read its threads back only once they are saved.
+                unloading.wait()
+            tenant.load()
+        except BaseException:
+            self._release(tenant)
+            raise
+        return tenant
+
+    def _release(self, tenant: Tenant):
+        # No I/O here, so this is safe to call on the event loop.
+        with self._lock:
+            tenant.users -= 1
+
+    def _release_acquired(self, acquiring: "asyncio.Future[Tenant]"):
+        if not acquiring.cancelled() and acquiring.exception() is None:
+            self._release(acquiring.result())
+
+    def _evict(self) -> List[Tenant]:
+        """Removes the least recently used unpinned tenants beyond the limit. Call with the lock held."""
+        excess = len(self._tenants) - self.max_loaded
+        if excess <= 0:
+            return []
+        evicted = [t for t in self._tenants.values() if not t.users][:excess]
+        for tenant in evicted:
+            del self._tenants[tenant.id]
+            self._unloading[tenant.id] = threading.Event()
+        return evicted
+
+    def _unload(self, evicted: List[Tenant]):
+        for tenant in evicted:
+            try:
+                tenant.unload()
+            except Exception as e:
+                print(f"Error saving tenant {tenant.id}: {e}")
+            finally:
+                with self._lock:
+                    done = self._unloading.pop(tenant.id)
+                done.set()
+
+    def save_all(self):
+        """Writes the threads of every loaded tenant that changed to disk. Blocking."""
+        with self._lock:
+            loaded = list(self._tenants.values())
+        for tenant in loaded:
+            if tenant.thread_store is not None:
+                tenant.thread_store.save()
+
+
+tenants = TenantRegistry(MAX_LOADED_TENANTS)
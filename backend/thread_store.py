@@ -1,7 +1,15 @@
+from __future__ import annotations
+
+import os
+import json
+import threading
 from uuid import uuid4
 from datetime import datetime
-from openai.types.chat import ChatCompletionMessageParam
-from typing import Dict, List, Optional, TypeAlias, TypedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, TypeAlias, TypedDict
+
+if TYPE_CHECKING:
+    # Type-only: importing openai costs a few hundred ms at boot.
+    from openai.types.chat import ChatCompletionMessageParam
 
 # Message structure: holds an OpenAI message object and an optional ID
 class Message(TypedDict):
@@ -19,57 +27,98 @@ class Thread(TypedDict):
 class ThreadStore:
     """
     Manages storage and retrieval of chat threads and messages.
+
+    Threads are held in memory. With a `path`, they are loaded from that JSON
+    file on creation and written back by save() when they changed. Methods may
+    be called from several threads at once.
     """
 
-    def __init__(self):
-        """Initializes an empty store for threads."""
+    def __init__(self, path: Optional[str] = None):
+        """Initializes the store, loading any threads saved at `path`."""
+        self.path = path
         self._threads: Dict[ThreadId, Thread] = {}
+        # Set by every change, cleared once it has been saved.
+        self._dirty = False
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self._threads = json.load(f)
+
+    def save(self):
+        """Writes all threads to `path` if they changed since the last save, replacing the file atomically."""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                data = json.dumps(self._threads)
+                self._dirty = False
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = self.path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    f.write(data)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                with self._lock:
+                    self._dirty = True
+                raise
 
     def create_thread(self, title: str) -> Thread:
-        thread_id = str(uuid4())
-        new_thread: Thread = {
-            "threadId": thread_id,
-            "title": title,
-            "createdAt": datetime.now().isoformat(),
-            "messages": []
-        }
-        self._threads[thread_id] = new_thread
-        return new_thread
+        with self._lock:
+            self._dirty = True
+            thread_id = str(uuid4())
+            new_thread: Thread = {
+                "threadId": thread_id,
+                "title": title,
+                "createdAt": datetime.now().isoformat(),
+                "messages": []
+            }
+            self._threads[thread_id] = new_thread
+            return new_thread
 
     def get_thread(self, thread_id: ThreadId) -> Optional[Thread]:
         return self._threads.get(thread_id)
 
     def list_threads(self) -> List[Dict]:
         """Returns a list of threads with metadata only."""
-        return [
-            {
-                "threadId": t["threadId"],
-                "title": t["title"],
-                "createdAt": t["createdAt"]
-            }
-            for t in self._threads.values()
-        ]
+        with self._lock:
+            return [
+                {
+                    "threadId": t["threadId"],
+                    "title": t["title"],
+                    "createdAt": t["createdAt"]
+                }
+                for t in self._threads.values()
+            ]
 
     def delete_thread(self, thread_id: ThreadId):
-        if thread_id in self._threads:
-            del self._threads[thread_id]
+        with self._lock:
+            if thread_id in self._threads:
+                del self._threads[thread_id]
+                self._dirty = True
 
     def update_thread(self, thread_id: ThreadId, title: str) -> Optional[Thread]:
-        if thread_id in self._threads:
-            self._threads[thread_id]['title'] = title
-            return self._threads[thread_id]
-        return None
+        with self._lock:
+            if thread_id in self._threads:
+                self._threads[thread_id]['title'] = title
+                self._dirty = True
+                return self._threads[thread_id]
+            return None
 
     def get_messages(self, thread_id: ThreadId) -> List[ChatCompletionMessageParam]:
         """
         Retrieves all messages for a given thread ID, extracting the base OpenAI
         message object required for the API call.
         """
-        thread = self._threads.get(thread_id)
-        if not thread:
-            return []
-        return [msg['openai_message'] for msg in thread['messages']]
-    
+        with self._lock:
+            thread = self._threads.get(thread_id)
+            if not thread:
+                return []
+            return [msg['openai_message'] for msg in thread['messages']]
+
     def get_messages_all(self, thread_id: ThreadId) -> List[Message]:
         thread = self._threads.get(thread_id)
         if not thread:
@@ -81,32 +130,35 @@ class ThreadStore:
         Appends a single message to the specified thread.
         Creates thread if it doesn't exist (fallback backend behavior).
         """
-        if thread_id not in self._threads:
-             self._threads[thread_id] = {
-                "threadId": thread_id,
-                "title": "New Chat",
-                "createdAt": datetime.now().isoformat(),
-                "messages": []
-            }
-        self._threads[thread_id]['messages'].append(message)
+        with self._lock:
+            self._dirty = True
+            if thread_id not in self._threads:
+                 self._threads[thread_id] = {
+                    "threadId": thread_id,
+                    "title": "New Chat",
+                    "createdAt": datetime.now().isoformat(),
+                    "messages": []
+                }
+            self._threads[thread_id]['messages'].append(message)
 
     def update_message(self, thread_id: ThreadId, updated_message: Message):
-        if thread_id in self._threads:
-            messages = self._threads[thread_id]['messages']
-            for i, msg in enumerate(messages):
-                if msg.get('id') == updated_message.get('id'):
-                    messages[i] = updated_message
-                    return
+        with self._lock:
+            if thread_id in self._threads:
+                messages = self._threads[thread_id]['messages']
+                for i, msg in enumerate(messages):
+                    if msg.get('id') == updated_message.get('id'):
+                        messages[i] = updated_message
+                        self._dirty = True
+                        return
 
     def append_messages(self, thread_id: ThreadId, messages: List[Message]):
-        if thread_id not in self._threads:
-             self._threads[thread_id] = {
-                "threadId": thread_id,
-                "title": "New Chat",
-                "createdAt": datetime.now().isoformat(),
-                "messages": []
-            }
-        self._threads[thread_id]['messages'].extend(messages)
-
-
-thread_store = ThreadStore()
+        with self._lock:
+            self._dirty = True
+            if thread_id not in self._threads:
+                 self._threads[thread_id] = {
+                    "threadId": thread_id,
+                    "title": "New Chat",
+                    "createdAt": datetime.now().isoformat(),
+                    "messages": []
+                }
+            self._threads[thread_id]['messages'].extend(messages)
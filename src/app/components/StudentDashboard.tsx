@@ -8,6 +8,12 @@ import {
   Home, 
   BookOpen, 
   Plane,
+  Tv,
+  Zap,
+  Dumbbell,
+  HeartPulse,
+  ShoppingBag,
+  Ticket,
   ChevronLeft,
   ChevronRight,
   MessageSquare,
@@ -39,6 +45,12 @@ const getCategoryIcon = (category: string) => {
     case 'Transport': return Plane;
     case 'Books': return BookOpen;
     case 'Income': return Wallet;
+    case 'Subscriptions': return Tv;
+    case 'Utilities': return Zap;
+    case 'Fitness': return Dumbbell;
+    case 'Health': return HeartPulse;
+    case 'Shopping': return ShoppingBag;
+    case 'Entertainment': return Ticket;
     default: return CreditCard;
   }
 };
@@ -323,7 +335,7 @@ export const StudentDashboard = ({ onOpenChat }: { onOpenChat?: () => void }) =>
       .then(res => res.json())
       .then((data: any[]) => {
         const processedTx = data.map((t, idx) => {
-          const cat = inferCategory(t.Description);
+          const cat = t.Category ?? inferCategory(t.Description);
           const credit = Number(t.Credit) || 0;
           const debit = Number(t.Debit) || 0;
           const amount = credit + debit;